@@ -1,15 +1,17 @@
 import os
+import shutil
+import importlib.util
 import warnings
 import joblib
 import numpy as np
 import pandas as pd
+import torch
 from typing import Optional, Dict, Tuple, List
 from darts.models.forecasting.transformer_model import TransformerModel
 from darts import TimeSeries
 from schema.data_schema import ForecastingSchema
 from sklearn.exceptions import NotFittedError
 from torch import cuda
-from sklearn.preprocessing import MinMaxScaler
 from pytorch_lightning.callbacks.early_stopping import EarlyStopping
 from logger import get_logger
 
@@ -18,10 +20,93 @@ warnings.filterwarnings("ignore")
 
 PREDICTOR_FILE_NAME = "predictor.joblib"
 MODEL_FILE_NAME = "model.joblib"
+MAX_GPU_PREDICT_BATCH_SIZE = 1024
 
 logger = get_logger(task_name="model")
 
 
+def _min_max_params(values: np.ndarray, axis: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes min-max scaling parameters along the given axis, ignoring NaN padding.
+    Constant ranges are set to 1, mirroring sklearn's MinMaxScaler.
+
+    Args:
+        values (np.ndarray): The values to compute the scaling parameters for.
+        axis (int): The axis along which the minimum and maximum are computed.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The minimums and ranges (keeping reduced dimensions).
+    """
+    mins = np.nanmin(values, axis=axis, keepdims=True)
+    ranges = np.nanmax(values, axis=axis, keepdims=True) - mins
+    ranges[ranges == 0] = 1
+    return mins, ranges
+
+
+def _enable_tf32_matmul() -> None:
+    """
+    Lets float32 matrix multiplications run on TF32 tensor cores when a GPU is available.
+
+    Returns: None
+    """
+    if cuda.is_available():
+        torch.set_float32_matmul_precision("high")
+
+
+def _compile_backend_available() -> bool:
+    """
+    Checks whether the torch.compile (Inductor) backend can generate code on this host.
+    Inductor needs a C++ compiler on CPU, and Triton plus a C compiler on GPU.
+
+    Returns:
+        bool: True if the required compilers are available.
+    """
+    if cuda.is_available():
+        if importlib.util.find_spec("triton") is None:
+            return False
+        compilers = [os.environ.get("CC"), "cc", "gcc", "clang"]
+    else:
+        compilers = [os.environ.get("CXX"), "c++", "g++", "clang++"]
+    return any(compiler and shutil.which(compiler) for compiler in compilers)
+
+
+def _available_cpu_count() -> int:
+    """
+    Returns the number of CPUs the process can use.
+    Accounts for the CPU affinity mask and the cgroup CPU quota (e.g. docker --cpus).
+
+    Returns:
+        int: The number of available CPUs (at least 1).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count() or 1
+
+    quota_files = [
+        ("/sys/fs/cgroup/cpu.max", None),
+        (
+            "/sys/fs/cgroup/cpu/cpu.cfs_quota_us",
+            "/sys/fs/cgroup/cpu/cpu.cfs_period_us",
+        ),
+    ]
+    for quota_file, period_file in quota_files:
+        try:
+            with open(quota_file) as f:
+                values = f.read().split()
+            if period_file:
+                with open(period_file) as f:
+                    values.append(f.read().strip())
+            quota, period = values[0], values[1]
+            if quota != "max" and int(quota) > 0:
+                count = min(count, int(quota) // int(period))
+            break
+        except (OSError, ValueError, IndexError):
+            continue
+
+    return max(count, 1)
+
+
 class Forecaster:
     """A wrapper class for the Transformer Forecaster.
 
@@ -49,6 +134,10 @@ class Forecaster:
         optimizer_kwargs: Optional[Dict] = None,
         use_exogenous: bool = True,
         random_state: Optional[int] = 0,
+        num_loader_workers: int = 0,
+        quantize_on_load: bool = False,
+        predict_batch_size: Optional[int] = None,
+        compile_model: bool = False,
         **kwargs,
     ):
         """Construct a new Transformer Forecaster
@@ -120,6 +209,24 @@ class Forecaster:
 
             random_state (int): Sets the underlying random seed at model initialization time.
 
+            num_loader_workers (int):
+                Number of workers used by the PyTorch DataLoader during training (default=0, main process).
+                Darts restarts the workers every epoch, so this only pays off when loading a batch is expensive.
+
+            quantize_on_load (bool):
+                If true, the Linear layers are quantized to int8 (dynamic quantization) when the model is loaded on a CPU-only host.
+                This speeds up CPU inference at the cost of some accuracy (default=False).
+
+            predict_batch_size (Optional[int]):
+                Batch size used for prediction. If not specified and compile_model is set on GPU, all series are
+                predicted in a single batch (capped at 1024 series) so that the CUDA graphs captured by torch.compile
+                are replayed across the autoregressive steps. Otherwise, the training batch size is used.
+
+            compile_model (bool):
+                If true, the transformer is compiled with torch.compile before prediction (default=False).
+                Requires a C compiler on the host. Compilation is paid on every new process,
+                so it only pays off when a loaded model serves many predictions.
+
             **kwargs: Optional arguments to initialize the pytorch_lightning.Module, pytorch_lightning.Trainer, and Darts' TorchForecastingModel.
         """
         self.data_schema = data_schema
@@ -136,6 +243,10 @@ class Forecaster:
         self.optimizer_kwargs = optimizer_kwargs
         self.use_exogenous = use_exogenous
         self.random_state = random_state
+        self.num_loader_workers = num_loader_workers
+        self.quantize_on_load = quantize_on_load
+        self.predict_batch_size = predict_batch_size
+        self.compile_model = compile_model
         self._is_trained = False
         self.kwargs = kwargs
         self.history_length = None
@@ -152,6 +263,14 @@ class Forecaster:
             lags = self.data_schema.forecast_length * lags_forecast_ratio
             self.input_chunk_length = lags
 
+        dimensions = [("d_model", d_model), ("dim_feedforward", dim_feedforward)]
+        for name, value in dimensions:
+            if value % 8 != 0:
+                logger.warning(
+                    f"{name} = ({value}) is not a multiple of 8."
+                    " GPU tensor cores require dimensions that are multiples of 8."
+                )
+
         stopper = EarlyStopping(
             monitor="train_loss",
             patience=30,
@@ -167,14 +286,78 @@ class Forecaster:
         else:
             print("GPU training not available.")
 
+    def _split_by_id(
+        self, data: pd.DataFrame, id_col: str
+    ) -> Tuple[List, List[pd.DataFrame]]:
+        """
+        Splits the data into one dataframe per series.
+        The data is sorted once by id and sliced at the boundaries of each id.
+
+        Args:
+            data (pd.DataFrame): The data containing all the series.
+            id_col (str): The name of the id column.
+
+        Returns:
+            Tuple[List, List[pd.DataFrame]]: The sorted ids and the series (without the id column).
+        """
+        data = data.sort_values(id_col, kind="stable")
+        all_ids, starts = np.unique(data[id_col].values, return_index=True)
+        ends = np.r_[starts[1:], len(data)]
+        data = data.drop(columns=id_col)
+        all_series = [data.iloc[start:end] for start, end in zip(starts, ends)]
+        return all_ids.tolist(), all_series
+
+    def _prepare_series(
+        self,
+        s: pd.DataFrame,
+        scaled_target: np.ndarray,
+        data_schema: ForecastingSchema,
+    ) -> Tuple[TimeSeries, Optional[TimeSeries]]:
+        """
+        Builds the target and past covariates of a single training series.
+
+        Args:
+            s (pd.DataFrame): The training data of the series.
+            scaled_target (np.ndarray): The scaled target values of the series.
+            data_schema (ForecastingSchema): The schema of the training data.
+
+        Returns:
+            Tuple[TimeSeries, Optional[TimeSeries]]: Target and Past covariates (None if there are no past covariates).
+        """
+        static_covariates = None
+        if self.data_schema.static_covariates:
+            static_covariates = s[self.data_schema.static_covariates].iloc[0]
+
+        target = TimeSeries.from_values(
+            scaled_target.reshape(-1, 1),
+            columns=[data_schema.target],
+            static_covariates=static_covariates,
+        )
+
+        past_covariates = None
+        past_static_covariates = (
+            data_schema.past_covariates + data_schema.static_covariates
+        )
+        if past_static_covariates:
+            original_values = s[past_static_covariates].to_numpy(dtype=np.float64)
+            past_min, past_scale = _min_max_params(original_values, axis=0)
+            scaled_values = (original_values - past_min) / past_scale
+            past_covariates = TimeSeries.from_values(
+                scaled_values.astype(np.float32),
+                columns=past_static_covariates,
+            )
+
+        return target, past_covariates
+
     def _prepare_data(
         self,
         history: pd.DataFrame,
         data_schema: ForecastingSchema,
-    ) -> Tuple[List, List, List]:
+    ) -> Tuple[List, List]:
         """
         Puts the data into the expected shape by the forecaster.
         Drops the time column and puts all the target series as columns in the dataframe.
+        Future covariates are not prepared since the TransformerModel does not support them.
 
         Args:
             history (pd.DataFrame): The provided training data.
@@ -182,178 +365,54 @@ class Forecaster:
 
 
         Returns:
-            Tuple[List, List, List]: Target, Past covariates and Future covariates.
+            Tuple[List, List]: Target and Past covariates.
         """
         targets = []
         past = []
-        future = []
-
-        future_covariates_names = data_schema.future_covariates
-        if data_schema.time_col_dtype in ["DATE", "DATETIME"]:
-            date_col = pd.to_datetime(history[data_schema.time_col])
-            year_col = date_col.dt.year
-            month_col = date_col.dt.month
-            year_col_name = f"{data_schema.time_col}_year"
-            month_col_name = f"{data_schema.time_col}_month"
-            history[year_col_name] = year_col
-            history[month_col_name] = month_col
-            future_covariates_names += [year_col_name, month_col_name]
-
-            year_col = date_col.dt.year
-            month_col = date_col.dt.month
-
-        groups_by_ids = history.groupby(data_schema.id_col)
-        all_ids = list(groups_by_ids.groups.keys())
-        all_series = [
-            groups_by_ids.get_group(id_).drop(columns=data_schema.id_col)
-            for id_ in all_ids
-        ]
+
+        all_ids, all_series = self._split_by_id(history, data_schema.id_col)
 
         self.all_ids = all_ids
-        scalers = {}
-        for index, s in enumerate(all_series):
-            if self.history_length:
-                s = s.iloc[-self.history_length :]
-            s.reset_index(inplace=True)
-
-            past_scaler = MinMaxScaler()
-            scaler = MinMaxScaler()
-            s[data_schema.target] = scaler.fit_transform(
-                s[data_schema.target].values.reshape(-1, 1)
-            )
+        if self.history_length:
+            all_series = [s.iloc[-self.history_length :] for s in all_series]
 
-            scalers[index] = scaler
-            static_covariates = None
-            if self.use_exogenous and self.data_schema.static_covariates:
-                static_covariates = s[self.data_schema.static_covariates]
-
-            target = TimeSeries.from_dataframe(
-                s,
-                value_cols=data_schema.target,
-                static_covariates=(
-                    static_covariates.iloc[0] if static_covariates is not None else None
-                ),
-            )
+        target_matrix = np.full(
+            (len(all_series), max(len(s) for s in all_series)), np.nan
+        )
+        for index, s in enumerate(all_series):
+            target_matrix[index, : len(s)] = s[data_schema.target].values
 
-            targets.append(target)
+        # Scaling is done in float64, only the scaled values are cast to float32
+        target_min, target_scale = _min_max_params(target_matrix, axis=1)
+        scaled_targets = ((target_matrix - target_min) / target_scale).astype(
+            np.float32
+        )
+        self._target_min = target_min.ravel()
+        self._target_scale = target_scale.ravel()
+
+        # Covariates are not used by the model without exogenous features
+        if not self.use_exogenous:
+            targets = [
+                TimeSeries.from_values(
+                    scaled_targets[index, : len(s)].reshape(-1, 1),
+                    columns=[data_schema.target],
+                )
+                for index, s in enumerate(all_series)
+            ]
+            return targets, None
 
-            past_static_covariates = (
-                data_schema.past_covariates + data_schema.static_covariates
+        for index, s in enumerate(all_series):
+            target, past_covariates = self._prepare_series(
+                s, scaled_targets[index, : len(s)], data_schema
             )
-            if past_static_covariates:
-                original_values = (
-                    s[past_static_covariates].values.reshape(-1, 1)
-                    if len(past_static_covariates) == 1
-                    else s[past_static_covariates].values
-                )
-                s[past_static_covariates] = past_scaler.fit_transform(original_values)
-                past_covariates = TimeSeries.from_dataframe(s[past_static_covariates])
+            targets.append(target)
+            if past_covariates is not None:
                 past.append(past_covariates)
 
-        future_scalers = {}
-        if future_covariates_names:
-            for id, train_series in zip(all_ids, all_series):
-                if self.history_length:
-                    train_series = train_series.iloc[-self.history_length :]
-
-                future_covariates = train_series[future_covariates_names]
-
-                future_covariates.reset_index(inplace=True)
-                future_scaler = MinMaxScaler()
-                original_values = (
-                    future_covariates[future_covariates_names].values.reshape(-1, 1)
-                    if len(future_covariates_names) == 1
-                    else future_covariates[future_covariates_names].values
-                )
-                future_covariates[future_covariates_names] = (
-                    future_scaler.fit_transform(original_values)
-                )
-
-                future_covariates = TimeSeries.from_dataframe(
-                    future_covariates[future_covariates_names]
-                )
-                future_scalers[id] = future_scaler
-                future.append(future_covariates)
-
-        self.scalers = scalers
-        self.future_scalers = future_scalers
-        if not past or not self.use_exogenous:
+        if not past:
             past = None
-        if not future or not self.use_exogenous:
-            future = None
-
-        return targets, past, future
-
-    def _prepare_test_data(
-        self,
-        data: pd.DataFrame,
-    ) -> List:
-        """
-        Prepares testing data.
-
-        Args:
-            data (pd.DataFrame): Testing data.
 
-        Returns (List): Training and testing future covariates concatenated together.
-
-        """
-        future = []
-        data_schema = self.data_schema
-        future_covariates_names = data_schema.future_covariates
-        if data_schema.time_col_dtype in ["DATE", "DATETIME"]:
-            date_col = pd.to_datetime(data[data_schema.time_col])
-            year_col = date_col.dt.year
-            month_col = date_col.dt.month
-            year_col_name = f"{data_schema.time_col}_year"
-            month_col_name = f"{data_schema.time_col}_month"
-            data[year_col_name] = year_col
-            data[month_col_name] = month_col
-            year_col = date_col.dt.year
-            month_col = date_col.dt.month
-
-        groups_by_ids = data.groupby(data_schema.id_col)
-        all_ids = list(groups_by_ids.groups.keys())
-        all_series = [
-            groups_by_ids.get_group(id_).drop(columns=data_schema.id_col)
-            for id_ in all_ids
-        ]
-
-        if future_covariates_names:
-            for id, test_series in zip(all_ids, all_series):
-                future_covariates = test_series[future_covariates_names]
-
-                future_covariates.reset_index(inplace=True)
-                future_scaler = self.future_scalers[id]
-                original_values = (
-                    future_covariates[future_covariates_names].values.reshape(-1, 1)
-                    if len(future_covariates_names) == 1
-                    else future_covariates[future_covariates_names].values
-                )
-
-                future_covariates[future_covariates_names] = future_scaler.transform(
-                    original_values
-                )
-
-                future_covariates = TimeSeries.from_dataframe(
-                    future_covariates[future_covariates_names]
-                )
-                future.append(future_covariates)
-
-        if not future or not self.use_exogenous:
-            future = None
-        else:
-            for index, (train_covariates, test_covariates) in enumerate(
-                zip(self.training_future_covariates, future)
-            ):
-                train_values = train_covariates.values()
-                test_values = test_covariates.values()
-
-                full_values = np.concatenate((train_values, test_values), axis=0)
-                full_series = TimeSeries.from_values(full_values)
-
-                future[index] = full_series
-
-        return future
+        return targets, past
 
     def _validate_input_chunk_and_history_lengths(self, series_length: int) -> None:
         """
@@ -385,6 +444,94 @@ class Forecaster:
                 f" input_chunk_length are set to to (history length - forecast horizon) = {self.input_chunk_length}"
             )
 
+    def _get_predict_batch_size(self) -> Optional[int]:
+        """
+        Returns the batch size to use for prediction.
+
+        Returns:
+            Optional[int]: The batch size, or None to use the training batch size.
+        """
+        if self.predict_batch_size:
+            return self.predict_batch_size
+        if self.compile_model and cuda.is_available():
+            return min(len(self.targets_series), MAX_GPU_PREDICT_BATCH_SIZE)
+        return None
+
+    def _compile_for_inference(self) -> None:
+        """
+        Compiles the underlying torch transformer with torch.compile (PyTorch >= 2.0) if compile_model is set.
+        A warm-up forward pass triggers the compilation so that failures are logged
+        and the original module is restored instead of failing the prediction.
+        Compilation is disabled for the instance after a failure so that it is not retried on every predict.
+
+        Returns: None
+        """
+        if not self.compile_model:
+            return
+
+        transformer = self.model.model.transformer
+        if hasattr(transformer, "_orig_mod"):
+            return
+
+        if not hasattr(torch, "compile") or not _compile_backend_available():
+            logger.warning(
+                "torch.compile requires PyTorch >= 2.0 and a C compiler"
+                " (and Triton on GPU). Running the model in eager mode."
+            )
+            self.compile_model = False
+            return
+
+        mode = "reduce-overhead" if cuda.is_available() else "default"
+        self.model.model.transformer = torch.compile(
+            transformer, mode=mode, fullgraph=False
+        )
+
+        n_features = self.targets_series[0].width
+        if self.past_covariates:
+            n_features += self.past_covariates[0].width
+        batch_size = self._get_predict_batch_size() or self.model.batch_size
+        device = "cuda" if cuda.is_available() else "cpu"
+        module = self.model.model.to(device).eval()
+        dummy_input = torch.zeros(
+            (batch_size, self.input_chunk_length, n_features),
+            dtype=next(module.parameters()).dtype,
+            device=device,
+        )
+        try:
+            with torch.inference_mode():
+                module((dummy_input, None))
+        except Exception as exc:
+            logger.warning(
+                f"torch.compile failed ({exc}). Running the model in eager mode."
+            )
+            self._restore_compiled_modules()
+            self.compile_model = False
+
+    def _restore_compiled_modules(self) -> None:
+        """
+        Replaces the compiled transformer by the original module since compiled modules cannot be pickled.
+
+        Returns: None
+        """
+        transformer = self.model.model.transformer
+        if hasattr(transformer, "_orig_mod"):
+            self.model.model.transformer = transformer._orig_mod
+
+    def _quantize_for_cpu_inference(self) -> None:
+        """
+        Applies dynamic int8 quantization to the Linear layers of the underlying torch model.
+        Only float32 models are quantized since dynamic quantization does not support float64 weights.
+
+        Returns: None
+        """
+        torch.set_num_threads(_available_cpu_count())
+        if next(self.model.model.parameters()).dtype != torch.float32:
+            return
+
+        torch.quantization.quantize_dynamic(
+            self.model.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+
     def fit(
         self,
         history: pd.DataFrame,
@@ -400,12 +547,13 @@ class Forecaster:
 
         """
         np.random.seed(self.random_state)
-        targets, past_covariates, future_covariates = self._prepare_data(
+        targets, past_covariates = self._prepare_data(
             history=history,
             data_schema=data_schema,
         )
 
         self._validate_input_chunk_and_history_lengths(series_length=len(targets[0]))
+        _enable_tf32_matmul()
 
         self.model = TransformerModel(
             input_chunk_length=self.input_chunk_length,
@@ -426,13 +574,13 @@ class Forecaster:
         self.model.fit(
             targets,
             past_covariates=past_covariates,
+            num_loader_workers=self.num_loader_workers,
         )
 
         self._is_trained = True
         self.data_schema = data_schema
         self.targets_series = targets
         self.past_covariates = past_covariates
-        self.training_future_covariates = future_covariates
 
     def predict(
         self, test_data: pd.DataFrame, prediction_col_name: str
@@ -448,19 +596,26 @@ class Forecaster:
         if not self._is_trained:
             raise NotFittedError("Model is not fitted yet.")
 
-        predictions = self.model.predict(
-            n=self.data_schema.forecast_length,
-            series=self.targets_series,
-            past_covariates=self.past_covariates,
+        self._compile_for_inference()
+        self.model.model.eval()
+        with torch.inference_mode():
+            predictions = self.model.predict(
+                n=self.data_schema.forecast_length,
+                series=self.targets_series,
+                past_covariates=self.past_covariates,
+                batch_size=self._get_predict_batch_size(),
+                num_loader_workers=0,
+            )
+        values = np.empty(
+            (len(predictions), self.data_schema.forecast_length), dtype=np.float64
         )
-        prediction_values = []
         for index, prediction in enumerate(predictions):
-            prediction = prediction.pd_dataframe()
-            values = prediction.values
-            values = self.scalers[index].inverse_transform(values)
-            prediction_values += list(values)
+            values[index] = prediction.values(copy=False).ravel()
+
+        np.multiply(values, self._target_scale[:, None], out=values)
+        np.add(values, self._target_min[:, None], out=values)
 
-        test_data[prediction_col_name] = np.array(prediction_values)
+        test_data[prediction_col_name] = values.ravel()
         return test_data
 
     def save(self, model_dir_path: str) -> None:
@@ -471,6 +626,7 @@ class Forecaster:
         """
         if not self._is_trained:
             raise NotFittedError("Model is not fitted yet.")
+        self._restore_compiled_modules()
         self.model.save(os.path.join(model_dir_path, MODEL_FILE_NAME))
         joblib.dump(self, os.path.join(model_dir_path, PREDICTOR_FILE_NAME))
 
@@ -486,6 +642,9 @@ class Forecaster:
         forecaster = joblib.load(os.path.join(model_dir_path, PREDICTOR_FILE_NAME))
         model = TransformerModel.load(os.path.join(model_dir_path, MODEL_FILE_NAME))
         forecaster.model = model
+        _enable_tf32_matmul()
+        if forecaster.quantize_on_load and not cuda.is_available():
+            forecaster._quantize_for_cpu_inference()
         return forecaster
 
     def __str__(self):